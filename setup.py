@@ -18,8 +18,11 @@ setuptools.setup(
         "License :: OSI Approved :: MIT License",
         "Operating System :: OS Independent",
     ],
-    python_requires='>=3',
+    python_requires='>=3.7',
     packages=setuptools.find_packages(),
     package_data={"": ["examples/*.csv", "examples/cba_sample_bypass.xlsx", "parameters/*/*.csv"]},
-    install_requires=["numpy>=1.16, <2", "pandas>=0.24, <1.3"],
+    install_requires=["numpy>=1.16, <2", "pandas>=0.24, <2"],
+    extras_require={
+        "fast": ["numexpr", "bottleneck"],
+    },
 )
@@ -1,10 +1,13 @@
 #!/usr/bin/env python3
+import os
 import transport_cba
 from transport_cba import RoadCBA
+from transport_cba.param_container import ParamContainer
 from transport_cba.sample_projects import load_sample_bypass
 
 import numpy as np
 import pandas as pd
+import pytest
 
 print(f"numpy version: {np.__version__}")
 print(f"pandas version: {pd.__version__}")
@@ -52,3 +55,94 @@ def test_road_param_cols():
 
 def test_capex_cols():
     pass
+
+def test_parameter_cache(tmp_path, monkeypatch):
+    """Cached parameters are identical to freshly wrangled ones"""
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    cba = RoadCBA(2020, "svk")
+    cba.prepare_parameters()
+
+    # first run stores the parameters
+    RoadCBA(2020, "svk").prepare_parameters(use_cache=True)
+    assert os.path.exists(cba._cache_path())
+
+    # second run must not read the raw parameters
+    def fail(self):
+        raise AssertionError("parameters not loaded from cache")
+
+    monkeypatch.setattr(ParamContainer, "read_raw_params", fail)
+    cba_cached = RoadCBA(2020, "svk")
+    cba_cached.prepare_parameters(use_cache=True)
+
+    for k in cba.df_clean.keys():
+        pd.testing.assert_frame_equal(cba.df_clean[k], cba_cached.df_clean[k])
+    pd.testing.assert_frame_equal(cba.cpi, cba_cached.cpi)
+
+def test_capex_before_start():
+    """CAPEX in years before the start of the economic period
+    is squeezed into the first year and none of it is lost"""
+    b = load_sample_bypass()
+    capex = b["capex"].copy()
+    capex.columns = [2017, 2018, 2019]
+    b["capex"] = capex
+
+    cba = RoadCBA(2020, "svk")
+    cba.read_project_inputs(*b.values())
+    cba._wrangle_capex()
+
+    assert list(cba.C_fin.columns) == [2020]
+    assert np.isclose(cba.C_fin[2020].sum(), capex.values.sum())
+
+def test_unknown_price_level():
+    """Price levels missing in the CPI table are reported"""
+    cba = RoadCBA(2020, "svk")
+    cba.read_raw_params()
+    cba.adjust_cpi()
+    cba.clean_params()
+    cba.df_clean["voc"]["price_level"] = 1800
+
+    with pytest.raises(ValueError, match="voc"):
+        cba.adjust_price_level()
+
+def test_sample_bypass_indicators():
+    """Economic indicators of the sample bypass are unchanged"""
+    b = load_sample_bypass()
+
+    cba = RoadCBA(2020, "svk")
+    cba.read_project_inputs(*b.values())
+    cba.economic_analysis()
+
+    assert cba.ENPV / 1e6 == pytest.approx(3.336, abs=1e-3)
+    assert cba.ERR * 100.0 == pytest.approx(5.620, abs=1e-3)
+    assert cba.EBCR == pytest.approx(1.076, abs=1e-3)
+
+def test_blank_tunnel_length():
+    """Blank lengths of tunnels give no OPEX, not nans"""
+    b = load_sample_bypass()
+    b["road_params"].loc[b["road_params"].index[0], "length_tunnels"] = np.nan
+
+    cba = RoadCBA(2020, "svk")
+    cba.read_project_inputs(*b.values())
+    cba.economic_analysis()
+
+    assert cba.O0_fin.isna().sum().sum() == 0
+    assert cba.O1_fin.isna().sum().sum() == 0
+
+def test_blank_unit_costs():
+    """Rows with blank unit costs are skipped in OPEX and accidents"""
+    b = load_sample_bypass()
+
+    cba = RoadCBA(2020, "svk")
+    cba.read_project_inputs(*b.values())
+    cba.economic_analysis()
+
+    cba.UC["c_op"].iloc[0, 5] = np.nan
+    cba.compute_opex()
+    assert cba.O0_fin.isna().sum().sum() == 0
+    assert cba.O1_fin.isna().sum().sum() == 0
+
+    key = tuple(cba.RP.loc[0, ["category", "lanes", "layout", "environment"]])
+    cba.UC["c_acc"].loc[key, cba.yr_init] = np.nan
+    cba._compute_accidents()
+    assert cba.B0["accidents"].loc[0].isna().all().all()
+    assert cba.NB["accidents"].notna().all()
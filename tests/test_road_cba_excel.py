@@ -27,3 +27,22 @@ def test_whole_cba_from_excel():
     print(pd.DataFrame(cba.df_eco).T)
 
     assert res["Value"].isna().sum() == 0
+
+def test_indicators_with_early_intensities():
+    """Intensities of D1 start in 2016 and of R2 in 2015, before
+    the economic period, the indicators must not depend on
+    the order of years produced by pandas"""
+    DIRN_BASE = os.path.dirname(os.path.realpath(__file__))
+    expected = {
+        "cba_inputs_d1_hp_ll_ds.xlsx": (548.966, 10.994, 1.521),
+        "cba_inputs_r2_soroska.xlsx": (-73.602, 1.158, 0.610),
+    }
+    for fname, (enpv, err, ebcr) in expected.items():
+        cba = RoadCBA(2019, "svk")
+        cba.read_project_inputs_excel(f"{DIRN_BASE}/../use_cases/{fname}")
+        cba.economic_analysis()
+
+        assert list(cba.df_eco.columns) == sorted(cba.df_eco.columns)
+        assert np.isclose(cba.ENPV / 1e6, enpv, atol=1e-3)
+        assert np.isclose(cba.ERR * 100.0, err, atol=1e-3)
+        assert np.isclose(cba.EBCR, ebcr, atol=1e-3)
@@ -1,5 +1,8 @@
 import pandas as pd
-from numpy import arange
+from numpy import arange, concatenate, cumprod, isnan
+import hashlib
+import inspect
+import pickle
 import os
 
 
@@ -11,8 +14,61 @@ svk_params = [
     "r_acc", "c_acc", "r_ghg", "c_ghg", "r_em", "c_em", "noise"
 ]
 
+# parameters with values given in units of the scale column
+SCALED_PARAMS = ["c_op", "vtts", "voc", "c_acc", "c_ghg", "c_em", "noise"]
+
+# descriptive columns not read into the parameter tables
+DROP_COLS = ["nb", "unit"]
+
+# known column types, spares type inference when parsing
+PARAM_DTYPES = {
+    "value": float, "scale": float, "gdp_growth_adjustment": float,
+    "price_level": int,
+}
+
+# file name and index column of each parameter table
+PARAM_FILES = {
+    # macro data
+    "gdp_growth": ("gdp_growth.csv", "year"),
+    "cpi": ("cpi.csv", "year"),
+    # financial data
+    "c_op": ("operation_cost.csv", 0),
+    "toll_op": ("toll_operation_cost.csv", 0),
+    "res_val": ("residual_value.csv", 0),
+    "c_fuel": ("fuel_cost.csv", 0),
+    # physical data
+    "fuel_rho": ("fuel_density.csv", "fuel"),
+    # economic data
+    "conv_fac": ("conversion_factors.csv", 0),
+    "occ_p": ("passenger_occupancy.csv", 0),
+    "occ_f": ("freight_occupancy.csv", 0),
+    "r_tp": ("trip_purpose.csv", 0),
+    "vtts": ("vtts.csv", 0),
+    "voc": ("voc.csv", 0),
+    "fuel_coeffs": ("fuel_consumption.csv", 0),
+    "r_fuel": ("fuel_ratio.csv", 0),
+    "r_acc": ("accident_rate.csv", 0),
+    "c_acc": ("accident_cost.csv", 0),
+    "r_ghg": ("greenhouse_rate.csv", 0),
+    "c_ghg": ("greenhouse_cost.csv", 0),
+    "r_em": ("emission_rate.csv", 0),
+    "c_em": ("emission_cost.csv", 0),
+    "noise": ("noise.csv", 0),
+}
+
+
+def user_cache_dir():
+    """Directory for cached data in the user's cache,
+    respecting XDG_CACHE_HOME if set"""
+    base = os.environ.get("XDG_CACHE_HOME") \
+        or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "transport_cba")
+
 
 class ParamContainer(object):
+    # raw frames shared by all instances, keyed by (path, mtime, index_col)
+    _csv_cache = {}
+
     def __init__(self, country, price_level, verbose=False):
         """Read in all the CBA values necessary for economic analysis
         for a given country"""
@@ -27,59 +83,79 @@ class ParamContainer(object):
         self.df_raw = {}
         self.df_clean = {}
 
+    def _read_csv(self, fname, index_col=0):
+        """Read a parameter file. The file is parsed only once
+        per session unless it has been modified in the meantime."""
+        path = self.dirn + fname
+        key = (path, os.path.getmtime(path), index_col)
+        if key not in ParamContainer._csv_cache:
+            ParamContainer._csv_cache[key] = pd.read_csv(path,
+                index_col=index_col, usecols=lambda c: c not in DROP_COLS,
+                dtype=PARAM_DTYPES)
+        return ParamContainer._csv_cache[key].copy()
+
     def read_raw_params(self):
         """Load all parameter dataframes"""
         if self.verbose:
             print("Reading CBA parameters...")
 
-        # macro data
-        self.gdp_growth = pd.read_csv(self.dirn + "gdp_growth.csv", index_col="year")
-        self.cpi = pd.read_csv(self.dirn + "cpi.csv", index_col="year")
-
-        # financial data
-        self.df_raw["c_op"] = \
-            pd.read_csv(self.dirn + "operation_cost.csv", index_col=0)
-        self.df_raw["toll_op"] = \
-            pd.read_csv(self.dirn + "toll_operation_cost.csv", index_col=0)
-        self.df_raw["res_val"] = \
-            pd.read_csv(self.dirn + "residual_value.csv", index_col=0)
-        self.df_raw["c_fuel"] = \
-            pd.read_csv(self.dirn + "fuel_cost.csv", index_col=0)
-
-        # physical data
-        self.fuel_rho = pd.read_csv(self.dirn + "fuel_density.csv", index_col="fuel")
-
-        # economic data
-        self.df_raw["conv_fac"] =\
-            pd.read_csv(self.dirn + "conversion_factors.csv", index_col=0)
-        self.df_raw["occ_p"] =\
-            pd.read_csv(self.dirn + "passenger_occupancy.csv", index_col=0)
-        self.df_raw["occ_f"] =\
-            pd.read_csv(self.dirn + "freight_occupancy.csv", index_col=0)
-        self.df_raw["r_tp"] =\
-            pd.read_csv(self.dirn + "trip_purpose.csv", index_col=0)
-        self.df_raw["vtts"] =\
-            pd.read_csv(self.dirn + "vtts.csv", index_col=0)
-        self.df_raw["voc"] =\
-            pd.read_csv(self.dirn + "voc.csv", index_col=0)
-        self.df_raw["fuel_coeffs"] =\
-            pd.read_csv(self.dirn + "fuel_consumption.csv", index_col=0)
-        self.df_raw["r_fuel"] =\
-            pd.read_csv(self.dirn + "fuel_ratio.csv", index_col=0)
-        self.df_raw["r_acc"] =\
-            pd.read_csv(self.dirn + "accident_rate.csv", index_col=0)
-        self.df_raw["c_acc"] =\
-            pd.read_csv(self.dirn + "accident_cost.csv", index_col=0)
-        self.df_raw["r_ghg"] =\
-            pd.read_csv(self.dirn + "greenhouse_rate.csv", index_col=0)
-        self.df_raw["c_ghg"] =\
-            pd.read_csv(self.dirn + "greenhouse_cost.csv", index_col=0)
-        self.df_raw["r_em"] =\
-            pd.read_csv(self.dirn + "emission_rate.csv", index_col=0)
-        self.df_raw["c_em"] =\
-            pd.read_csv(self.dirn + "emission_cost.csv", index_col=0)
-        self.df_raw["noise"] =\
-            pd.read_csv(self.dirn + "noise.csv", index_col=0)
+        dfs = {k: self._read_csv(*f) for k, f in PARAM_FILES.items()}
+
+        self.gdp_growth = dfs.pop("gdp_growth")
+        self.cpi = dfs.pop("cpi")
+        self.fuel_rho = dfs.pop("fuel_rho")
+        self.df_raw.update(dfs)
+
+    def _cache_path(self):
+        """Path of the pickled clean parameters in the user's cache,
+        unique for the price level, the state of the parameter files
+        and of the modules doing the wrangling"""
+        h = hashlib.md5(("%s|%s" % (self.pl, pd.__version__)).encode())
+        for src in sorted({__file__, inspect.getfile(type(self))}):
+            h.update(("%s|%s" % (src, os.path.getmtime(src))).encode())
+        for fname in sorted(os.listdir(self.dirn)):
+            if fname.endswith(".csv"):
+                st = os.stat(self.dirn + fname)
+                h.update(("%s|%s|%s" % (fname, st.st_mtime, st.st_size)).encode())
+        return os.path.join(user_cache_dir(), self.country,
+            "params_%s_%s.pkl" % (self.pl, h.hexdigest()))
+
+    def load_cached_params(self):
+        """Load the clean parameters stored by a previous run.
+        Return True if successful."""
+        path = self._cache_path()
+        if not os.path.exists(path):
+            return False
+        try:
+            with open(path, "rb") as f:
+                self.cpi, self.gdp_growth, self.df_clean = pickle.load(f)
+        except Exception:
+            return False
+        if self.verbose:
+            print("Loaded clean parameters from %s" % path)
+        return True
+
+    def save_cached_params(self):
+        """Store the clean parameters to skip reading and wrangling
+        in the following runs. Fail silently if the directory
+        is not writable."""
+        path = self._cache_path()
+        dirn = os.path.dirname(path)
+        try:
+            os.makedirs(dirn, exist_ok=True)
+            with open(path + ".tmp", "wb") as f:
+                pickle.dump((self.cpi, self.gdp_growth, self.df_clean), f)
+            os.replace(path + ".tmp", path)
+
+            # remove outdated files for the same price level
+            prefix = "params_%s_" % self.pl
+            for fname in os.listdir(dirn):
+                fpath = os.path.join(dirn, fname)
+                if fname.startswith(prefix) and fname.endswith(".pkl") \
+                    and fpath != path:
+                    os.remove(fpath)
+        except OSError:
+            pass
 
     def adjust_cpi(self, infl=0.02, yr_min=1990, yr_max=2100):
         """Fill in mising values and compute cumulative inflation 
@@ -92,18 +168,11 @@ class ParamContainer(object):
         self.cpi["cpi"].fillna(infl, inplace=True)
 
         # compute cumulative CPI
-        self.cpi["cpi_index"] = ""
-        self.cpi["cpi_index"] = pd.to_numeric(self.cpi.cpi_index, errors="coerce")
-        self.cpi.loc[self.pl, "cpi_index"] = 1.0
+        r = self.cpi.cpi.values + 1.0
         ix = self.cpi.index.get_loc(self.pl)
-
-        # backward
-        for i in range(ix-1, -1, -1):
-            self.cpi.iloc[i]["cpi_index"] = self.cpi.iloc[i+1].cpi_index * (self.cpi.iloc[i].cpi + 1.0)
-        
-        # forward
-        for i in range(ix+1, len(self.cpi)):
-            self.cpi.iloc[i]["cpi_index"] = self.cpi.iloc[i-1].cpi_index * (self.cpi.iloc[i-1].cpi + 1.0)
+        backward = cumprod(r[:ix][::-1])[::-1] # years before price level
+        forward = cumprod(r[ix:-1]) # years after price level
+        self.cpi["cpi_index"] = concatenate([backward, [1.0], forward])
             
     def adjust_gdp_growth(self, yr_min=1990, yr_max=2100):
         """Fill in values for GDP growth to a maximum range"""
@@ -124,26 +193,21 @@ class ParamContainer(object):
         self.df_raw["c_ghg"] = self.df_raw["c_ghg"].fillna(method="ffill").fillna(method="bfill")
 
     def clean_params(self):
-        """Incorporate scale into values.
-        Remove unimportant columns. Populate the df_clean dictionary"""
+        """Incorporate scale into values. Populate the df_clean dictionary.
+        Unimportant columns are already skipped when reading the files."""
         if self.verbose:
             print("Cleaning parameters...")
-        for itm in self.df_raw.keys():
+        for itm, df in self.df_raw.items():
             if self.verbose:
                 print("    Cleaning: %s" % itm)
-            self.df_clean[itm] = self.df_raw[itm].copy()
-            if "nb" in self.df_clean[itm].columns:
-                self.df_clean[itm].drop(columns=["nb"], inplace=True)
-            if "unit" in self.df_clean[itm].columns:
-                self.df_clean[itm].drop(columns=["unit"], inplace=True)
-        
-        # adjusting scale if supplied
-        for c in ["c_op", "vtts", "voc", "c_acc", "c_ghg", "c_em", "noise"]:
-            if "scale" in self.df_clean[c].columns:
+            if itm in SCALED_PARAMS and "scale" in df.columns:
                 if self.verbose:
-                    print("Changing scale of %s" % c)
-                self.df_clean[c]["value"] = self.df_clean[c].value * self.df_clean[c].scale
-                self.df_clean[c].drop(columns=["scale"], inplace=True)
+                    print("    Changing scale of %s" % itm)
+                # drop returns a new frame, no need to copy
+                self.df_clean[itm] = df.drop(columns=["scale"])
+                self.df_clean[itm]["value"] = df.value.values * df.scale.values
+            else:
+                self.df_clean[itm] = df.copy()
 
     def adjust_price_level(self):
         """Unify the prices for one price level"""
@@ -152,9 +216,13 @@ class ParamContainer(object):
         for c in ["c_op", "toll_op", "vtts", "voc", "c_fuel", "c_acc", "c_ghg", "c_em", "noise"]:
             if self.verbose:
                 print("    Adjusting: %s" % c)
-            self.df_clean[c]["value"] = \
-                self.df_clean[c].value * self.df_clean[c].price_level\
-                .map(lambda x: self.cpi.loc[x].cpi_index)
+            factors = self.cpi.cpi_index\
+                .reindex(self.df_clean[c].price_level).values
+            if isnan(factors).any():
+                missing = sorted(set(self.df_clean[c].price_level[isnan(factors)]))
+                raise ValueError(
+                    "Price levels %s of '%s' not found in the CPI table." % (missing, c))
+            self.df_clean[c]["value"] = self.df_clean[c].value.values * factors
             self.df_clean[c].drop(columns=["price_level"], inplace=True)
             self.df_clean[c]["value"] = self.df_clean[c].value#.round(3)
 
@@ -173,8 +241,8 @@ class ParamContainer(object):
     def _wrangle_opex(self):
         """Set up index"""
         c = "c_op"
-        self.df_clean[c].reset_index(inplace=True)
-        self.df_clean[c].set_index(["item", "operation_type", "category"], inplace=True)
+        self.df_clean[c].set_index(["operation_type", "category"],
+            append=True, inplace=True)
 
     def _wrangle_vtts(self):
         """Average the value of the travel time saved"""
@@ -186,7 +254,7 @@ class ParamContainer(object):
             vtts = gr["value"].mean()
             vtts = vtts.reset_index()
         else:
-            vtts = self.df_clean["vtts"].copy()
+            vtts = self.df_clean["vtts"]
 
         # add trip purpose and merge
         r_tp = self.df_clean["r_tp"].reset_index().melt(
@@ -225,18 +293,17 @@ class ParamContainer(object):
         vtts["gdp_ga2"] = vtts.purpose_ratio * vtts.gdp_growth_adjustment
         vtts["value2"] = vtts.purpose_ratio * vtts.value
 
-        vtts = vtts.groupby(["vehicle"])["gdp_ga2", "value2"].sum()
+        vtts = vtts.groupby(["vehicle"])[["gdp_ga2", "value2"]].sum()
         vtts.columns = ["gdp_growth_adjustment", "value"]
         vtts["value"] = vtts.value.round(2)
 
-        self.df_clean["vtts"] = vtts.copy()
+        self.df_clean["vtts"] = vtts
 
     def _wrangle_fuel(self):
         """Convert units from eur/l to eur/kg"""
         # fuel ratios for vehicle types
         c = "r_fuel"
-        self.df_clean[c].reset_index(inplace=True)
-        self.df_clean[c].set_index(["vehicle", "fuel"], inplace=True)
+        self.df_clean[c].set_index("fuel", append=True, inplace=True)
 
         # convert to kg/km and add conversion factors
         c = "c_fuel"
@@ -244,15 +311,12 @@ class ParamContainer(object):
         self.df_clean[c] *= self.df_clean["conv_fac"].loc["factor", "fuel"]
 
         c = "fuel_coeffs"
-        self.df_clean[c] = pd.merge(self.df_clean[c].reset_index(), 
-            self.fuel_rho.drop(columns=["unit"]), how="left", on="fuel")\
-            .set_index(["vehicle", "fuel"])
+        self.df_clean[c] = self.df_clean[c].set_index("fuel", append=True)
+        rho = self.df_clean[c].index.get_level_values("fuel")\
+            .map(self.fuel_rho.value).values
         
         # multiply polynomial coefficients by density
-        for itm in ["a0", "a1", "a2", "a3"]:
-            self.df_clean[c][itm] = \
-                self.df_clean[c][itm] * self.df_clean[c].value
-        self.df_clean[c].drop(columns=["value"], inplace=True)
+        self.df_clean[c] = self.df_clean[c].mul(rho, axis=0)
 
     def _wrangle_accidents(self):
         """Unify the two datasets storing values for accidents"""
@@ -271,11 +335,8 @@ class ParamContainer(object):
         
         # copy to the cost dataframe
         self.df_clean["c_acc"] = self.df_clean["r_acc"]\
-            [["lanes", "layout", "environment", "value", "gdp_growth_adjustment"]].copy()
-
-        self.df_clean["c_acc"].reset_index(inplace=True)
-        self.df_clean["c_acc"].set_index(\
-            ["category", "lanes", "layout", "environment"], inplace=True)
+            [["lanes", "layout", "environment", "value", "gdp_growth_adjustment"]]\
+            .set_index(["lanes", "layout", "environment"], append=True)
 
     def _wrangle_greenhouse(self):
         b = "r_ghg"
@@ -286,14 +347,12 @@ class ParamContainer(object):
 
     def _wrangle_emissions(self):
         b = "c_em"
-        self.df_clean[b].reset_index(inplace=True)
-        self.df_clean[b].set_index(["polluant", "environment"], inplace=True)
-        self.df_clean[b] = self.df_clean[b].sort_index()
+        self.df_clean[b] = self.df_clean[b]\
+            .set_index("environment", append=True).sort_index()
 
         b = "r_em"
-        self.df_clean[b].reset_index(inplace=True)
-        self.df_clean[b].set_index(["polluant", "vehicle", "fuel"], inplace=True)
-        self.df_clean[b] = self.df_clean[b].sort_index()
+        self.df_clean[b] = self.df_clean[b]\
+            .set_index(["vehicle", "fuel"], append=True).sort_index()
 
     def _wrangle_noise(self):
         b = "noise"
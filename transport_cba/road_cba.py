@@ -1,7 +1,5 @@
 import pandas as pd
 import numpy as np
-from numpy.matlib import repmat
-import numpy_financial as npf
 import time
 from .param_container import ParamContainer
 
@@ -81,6 +79,7 @@ class RoadCBA(ParamContainer):
         self.V0 = None
         self.V1 = None
         self.L = None
+        self.sec_env = None # sections with their environment
         self.T0 = None
         self.T1 = None
         self.I0 = None
@@ -110,14 +109,18 @@ class RoadCBA(ParamContainer):
     # =====
     # Initialisation functions
     # =====
-    def prepare_parameters(self, source=None):
+    def prepare_parameters(self, source=None, use_cache=False):
         """Read in CBA parameters and adjust them for furhter use.
-        Another source than the built-in one can be chosen."""
-        if source is None:
-            super().read_raw_params()
-        else:
+        Another source than the built-in one can be chosen.
+        With use_cache, clean parameters are stored in the user's
+        cache directory and reused in later runs."""
+        if source is not None:
             raise NotImplementedError()
 
+        if use_cache and super().load_cached_params():
+            return
+
+        super().read_raw_params()
         super().adjust_cpi()
         super().adjust_gdp_growth()
         super().adjust_greenhouse_cost()
@@ -125,6 +128,9 @@ class RoadCBA(ParamContainer):
         super().adjust_price_level()
         super().wrangle_params()
 
+        if use_cache:
+            super().save_cached_params()
+
     
     def replace_parameter(self, param):
         """Replace a specific parameter frame"""
@@ -138,7 +144,7 @@ class RoadCBA(ParamContainer):
             self.yr_op = int(self.C_fin.columns[-1]) + 1
             self.N_yr_build = len(self.C_fin.columns)
             self.N_yr_op = self.N_yr - self.N_yr_build
-            self.yrs_op = np.arange(self.yr_init + self.N_yr_build, self.yr_init + self.N_yr)
+            self.yrs_op = self.yrs[self.N_yr_build:]
 
             self.secs = self.RP.index
             self.secs_0 = self.RP[self.RP.variant_0 == 1].index
@@ -153,13 +159,7 @@ class RoadCBA(ParamContainer):
 
     def _wrangle_inputs(self):
         """Modify input matrices of intensities and velocities
-        in line with the economic period and other global requirements.
-        Ensure that the columns representing years are integers."""
-        self.I0.columns = self.I0.columns.astype(int)
-        self.I1.columns = self.I1.columns.astype(int)
-        self.V0.columns = self.V0.columns.astype(int)
-        self.V1.columns = self.V1.columns.astype(int)
-
+        in line with the economic period and other global requirements."""
         # remove unused rows in 0th variant
         self.I0 = self.I0.loc[self.secs_0]
         self.V0 = self.V0.loc[self.secs_0]
@@ -199,30 +199,17 @@ class RoadCBA(ParamContainer):
         - intensities in variant 1 : pd.dataframe
         - velocities in variant 0 : pd.dataframe
         - velocities in variant 1 : pd.dataframe
+
+        The dataframes are not copied, do not modify them afterwards.
         """
         if self.verbose:
             print("Reading project inputs from dataframes...")
         self.RP = df_road_params
-
-        self.C_fin = df_capex
-        self.C_fin.columns = self.C_fin.columns.astype(int)
-        self.C_fin = self.C_fin[sorted(self.C_fin.columns)]
-
-        self.I0 = df_int_0
-        self.I0.columns = self.I0.columns.astype(int)
-        self.I0 = self.I0[sorted(self.I0.columns)]
-       
-        self.I1 = df_int_1
-        self.I1.columns = self.I1.columns.astype(int)
-        self.I1 = self.I1[sorted(self.I1.columns)]
-
-        self.V0 = df_vel_0
-        self.V0.columns = self.V0.columns.astype(int)
-        self.V0 = self.V0[sorted(self.V0.columns)]
-        
-        self.V1 = df_vel_1
-        self.V1.columns = self.V1.columns.astype(int)
-        self.V1 = self.V1[sorted(self.V1.columns)]
+        self.C_fin = sort_year_columns(df_capex)
+        self.I0 = sort_year_columns(df_int_0)
+        self.I1 = sort_year_columns(df_int_1)
+        self.V0 = sort_year_columns(df_vel_0)
+        self.V1 = sort_year_columns(df_vel_1)
 
         # assign core variables
         self._assign_core_variables()
@@ -252,19 +239,19 @@ class RoadCBA(ParamContainer):
 
         self.I0 = xls.parse("intensities_0").reset_index(drop=True)
         self.I0.set_index(["id_section", "vehicle"], inplace=True)
-        self.I0 = self.I0[sorted(self.I0.columns)]
+        self.I0 = sort_year_columns(self.I0)
 
         self.I1 = xls.parse("intensities_1").reset_index(drop=True)
         self.I1.set_index(["id_section", "vehicle"], inplace=True)
-        self.I1 = self.I1[sorted(self.I1.columns)]
+        self.I1 = sort_year_columns(self.I1)
 
         self.V0 = xls.parse("velocities_0").reset_index(drop=True)
         self.V0.set_index(["id_section", "vehicle"], inplace=True)
-        self.V0 = self.V0[sorted(self.V0.columns)]
+        self.V0 = sort_year_columns(self.V0)
 
         self.V1 = xls.parse("velocities_1").reset_index(drop=True)
         self.V1.set_index(["id_section", "vehicle"], inplace=True)
-        self.V1 = self.V1[sorted(self.V1.columns)]
+        self.V1 = sort_year_columns(self.V1)
 
         self._assign_core_variables()
         self._wrangle_inputs()
@@ -323,27 +310,29 @@ class RoadCBA(ParamContainer):
         of the economic period"""
 
         if "category" in self.C_fin.columns:
-            self.C_fin.drop(columns="category", inplace=True)
+            self.C_fin = self.C_fin.drop(columns="category")
         if "category" in self.C_fin.index.names:
             self.C_fin = self.C_fin.reset_index("category")\
                 .drop(columns="category")
         if "total" in self.C_fin.columns:
-            self.C_fin.drop(columns="total", inplace=True)
-        self.C_fin.columns = self.C_fin.columns.astype(int)
+            self.C_fin = self.C_fin.drop(columns="total")
+        self.C_fin = sort_year_columns(self.C_fin)
 
-        self.C_fin.fillna(0, inplace=True)
+        # new frame, the input table is left untouched
+        self.C_fin = self.C_fin.fillna(0)
 
         # collect investment before the first year
         capex_yrs = self.C_fin.columns
-        if len(capex_yrs[capex_yrs < self.yr_init]) > 0:
+        ix = np.searchsorted(capex_yrs.values, self.yr_init)
+        if ix > 0:
             if self.verbose:
                 print(f"Squeezing CAPEX {capex_yrs} into the given economic period starting with {self.yr_init}...")
-            if self.yr_init not in capex_yrs:
-                self.C_fin[self.yr_init] = 0.0
-            yrs_bef = capex_yrs[capex_yrs < self.yr_init]
-            yrs_aft = capex_yrs[capex_yrs >= self.yr_init]
-            self.C_fin[self.yr_init] += self.C_fin[yrs_bef].sum(1)
-            self.C_fin = self.C_fin[yrs_aft]
+            capex_bef = self.C_fin.values[:, :ix].sum(1)
+            yrs_aft = capex_yrs[ix:]
+            if self.yr_init not in yrs_aft:
+                yrs_aft = yrs_aft.insert(0, self.yr_init)
+            self.C_fin = self.C_fin.reindex(columns=yrs_aft, fill_value=0.0)
+            self.C_fin[self.yr_init] += capex_bef
 
 
     def compute_capex(self):
@@ -355,16 +344,14 @@ class RoadCBA(ParamContainer):
         self._wrangle_capex()
 
         # reindex columns
-        self.C_fin = pd.DataFrame(self.C_fin, columns=self.yrs).fillna(0)
+        self.C_fin = self.C_fin.reindex(columns=self.yrs, fill_value=0.0)
         self.C_fin_tot = pd.DataFrame(self.C_fin.sum(1), columns=["value"])
 
         # apply conversion factors to get economic CAPEX
-        self.cf = self.C_fin.copy()\
-            .merge(self.df_clean["conv_fac"][["aggregate"]], \
-            how="left", on="item")\
-            .fillna(self.df_clean["conv_fac"]\
-            .loc["construction", "aggregate"])["aggregate"]
-        self.C_eco = self.C_fin.multiply(self.cf, axis=0)
+        CF = self.df_clean["conv_fac"]["aggregate"]
+        cf_constr = float(CF.at["construction"])
+        self.cf = self.C_fin.index.to_series().map(CF).fillna(cf_constr)
+        self.C_eco = self.C_fin.multiply(self.cf.values, axis=0)
         self.C_eco_tot = pd.DataFrame(self.C_eco.sum(1), columns=["value"])
 
         self.NC["capex"] = self.C_eco.sum()
@@ -378,12 +365,12 @@ class RoadCBA(ParamContainer):
         RV = self.df_clean["res_val"].copy()
         RV.replacement_cost_ratio.fillna(1.0, inplace=True)
         RV["op_period"] = self.N_yr_op
-        RV["replace"] = np.where(RV.lifetime <= RV.op_period, 1, 0)
-        RV["rem_ratio"] = np.where(
-            RV.lifetime <= RV.op_period,
-            (2*RV.lifetime - RV.op_period) / RV.lifetime,
-            (RV.lifetime - RV.op_period) / RV.lifetime
-        ).round(2)
+        lt = RV.lifetime.values
+        replace = lt <= self.N_yr_op
+        RV["replace"] = replace.astype(int)
+        with np.errstate(invalid="ignore"): # infinite lifetime of land
+            RV["rem_ratio"] = np.round(
+                np.where(replace, 2*lt - self.N_yr_op, lt - self.N_yr_op) / lt, 2)
         RV.rem_ratio.fillna(1.0, inplace=True) # fill land
 
         # financial
@@ -412,79 +399,75 @@ class RoadCBA(ParamContainer):
 
         assert len(self.UC.keys()) != 0, "before computing OPEX, create unit costs first"
 
-        UC = self.UC["c_op"].copy()
+        UC = self.UC["c_op"]
         lvl_order = ["id_section", "operation_type", "item"]
 
-        # create area matrix
-        def define_area(x):
-            return x if x in ["tunnels", "bridges"] else "pavements"
-
-        UC = UC.reset_index(["item"])
-        UC["area_type"] = UC.item.map(lambda x: define_area(x))
-        UC = UC.reset_index().set_index(
-            ["category", "operation_type", "area_type", "item"]).sort_index()
-        
-        # variant 0
-        RA0 = self.RP.loc[self.secs_0, 
-            ["category", "length", "length_bridges", "length_tunnels", "width"]].copy()
-        RA0["pavements"] = RA0.width * RA0.length * 1e3
-        RA0["bridges"] = RA0.width * RA0.length_bridges * 1e3
-        RA0["tunnels"] = RA0.width * RA0.length_tunnels * 1e3
-        RA0 = RA0.drop(
-            columns=["length", "length_bridges", "length_tunnels", "width"])
-        RA0 = RA0.reset_index().melt(id_vars=["id_section", "category"],
-            var_name="area_type", value_name="value")
-        RA0 = RA0.groupby(["id_section", "category", "area_type"])\
-            [["value"]].sum()
-        
-        # time matrix of road areas
-        RA0 = pd.DataFrame(np.outer(RA0.value, np.ones_like(self.yrs)), \
-            index=RA0.index, columns=self.yrs)
+        # add the area type of each item to the index
+        item = UC.index.get_level_values("item")
+        area_type = np.where(item.isin(["tunnels", "bridges"]),
+            item, "pavements")
+        ind = pd.MultiIndex.from_arrays([
+            UC.index.get_level_values("category"),
+            UC.index.get_level_values("operation_type"),
+            area_type, item],
+            names=["category", "operation_type", "area_type", "item"])
+        UC = pd.DataFrame(UC.values, index=ind, columns=UC.columns)\
+            .sort_index()
         
-        # summary
         assert hasattr(self, "mask0"), "Create OPEX mask first."
-        self.O0_fin = (RA0 * (UC * self.mask0)).dropna().droplevel(
-            ["category", "area_type"]).reorder_levels(lvl_order).sort_index()
-        
+
+        def opex(secs, mask):
+            """OPEX of the road areas of sections in a single
+            aligned product of areas, unit costs and the mask"""
+            RA = self._time_matrix(self._road_areas(secs), view=True)
+            ind = RA.index.join(UC.index, how="inner",
+                return_indexers=True)[0]
+            O = self._aligned_product(ind, RA, UC, mask).dropna()
+            return O.droplevel(["category", "area_type"])\
+                .reorder_levels(lvl_order).sort_index()
+
+        # variant 0
+        self.O0_fin = opex(self.secs_0, self.mask0)
+
         # variant 1
-        O1_old = self.O0_fin.loc[self.secs_old].copy()
-        O1_repl = self.O0_fin.loc[self.secs_repl].copy()
-        if not O1_repl.empty:
-            O1_repl[self.yrs_op] = 0.0
-        
-        RA1 = self.RP.loc[self.secs_new,
-            ["category", "length", "length_bridges", "length_tunnels", "width"]].copy()
-        RA1["pavements"] = RA1.width * RA1.length * 1e3
-        RA1["bridges"] = RA1.width * RA1.length_bridges * 1e3
-        RA1["tunnels"] = RA1.width * RA1.length_tunnels * 1e3
-        RA1 = RA1.drop(
-            columns=["length", "length_bridges", "length_tunnels", "width"])
-        RA1 = RA1.reset_index().melt(id_vars=["id_section", "category"],
-            var_name="area_type", value_name="value")
-        RA1 = RA1.groupby(["id_section", "category", "area_type"])[["value"]].sum()
-        
-        # time matrix of road areas
-        RA1 = pd.DataFrame(np.outer(RA1.value, np.ones_like(self.yrs)),
-            index=RA1.index, columns=self.yrs)
-        
-        # summary
-        O1_new = (RA1 * (UC * self.mask1)).dropna().droplevel(
-            ["category", "area_type"]).reorder_levels(lvl_order).sort_index()
-        self.O1_fin = pd.concat([O1_old, O1_repl, O1_new]).sort_index()
+        # old and replaced sections, the latter without OPEX in operation
+        sec = self.O0_fin.index.get_level_values("id_section")
+        O1 = self.O0_fin[sec.isin(self.secs_old) | sec.isin(self.secs_repl)]
+        repl = O1.index.get_level_values("id_section").isin(self.secs_repl)
+        zero = repl[:, None] & O1.columns.isin(self.yrs_op)[None, :]
+        O1 = pd.DataFrame(np.where(zero, 0.0, O1.values),
+            index=O1.index, columns=O1.columns)
+
+        O1_new = opex(self.secs_new, self.mask1)
+        self.O1_fin = pd.concat([O1, O1_new]).sort_index()
         
         # economic values
-        c = "conv_fac"
-        cf = self.df_clean[c]\
-            .loc[self.df_clean[c].expense_type == "operation", "aggregate"]
+        CF = self.df_clean["conv_fac"]
+        cf = CF["aggregate"][CF["expense_type"].values == "operation"]
         cf.index.name = "operation_type"
-        cf = pd.DataFrame(np.outer(cf, np.ones_like(self.yrs)),
-            columns=self.yrs, index=cf.index)
+        cf = self._time_matrix(cf, view=True)
         
         self.O0_eco = self.O0_fin * cf
         self.O1_eco = self.O1_fin * cf
         self.NC["opex"] = self.O1_eco.sum() - self.O0_eco.sum()
 
 
+    def _road_areas(self, secs):
+        """Areas of bridges, pavements and tunnels in m2
+        by section and road category, blank lengths give zero area"""
+        area_types = ["bridges", "pavements", "tunnels"]
+        RP = self.RP.loc[secs]
+        lengths = RP[["length_bridges", "length", "length_tunnels"]].values
+        areas = np.nan_to_num(RP.width.values[:, None] * lengths * 1e3)
+
+        ind = pd.MultiIndex.from_arrays([
+            np.repeat(RP.index.values, len(area_types)),
+            np.repeat(RP.category.values, len(area_types)),
+            np.tile(area_types, len(RP))],
+            names=["id_section", "category", "area_type"])
+        return pd.Series(areas.ravel(), index=ind).sort_index()
+
+
     def _compute_toll(self):
         raise NotImplementedError()
 
@@ -497,25 +480,24 @@ class RoadCBA(ParamContainer):
         if self.verbose:
             print("Creating time matrices for benefits...")
 
+        # GDP growth in the years after the initial one
+        gdp_growth = self.gdp_growth.gdp_growth.loc[self.yrs[1:]].values
         for b in ["c_op", "toll_op", \
             "vtts", "voc", "c_fuel", "c_acc", "c_em", "noise"]:
             if self.verbose:
                 print("    Creating: %s" % b)
-            self.UC[b] = \
-                pd.DataFrame(columns=self.yrs, index=self.df_clean[b].index)
-            self.UC[b][self.yr_init] = self.df_clean[b].value
-            for yr in self.yrs[1:]:
-                self.UC[b][yr] = \
-                    self.UC[b][self.yr_init]# * self.cpi.loc[yr, "cpi_index"]
-                if "gdp_growth_adjustment" in self.df_clean[b].columns:
-                    self.UC[b][yr] = self.UC[b][yr] \
-                    * (1.0 + self.gdp_growth.loc[yr].gdp_growth \
-                    * self.df_clean[b].gdp_growth_adjustment)
+            df = self.df_clean[b]
+            growth = np.ones((len(df), len(self.yrs)))
+            if "gdp_growth_adjustment" in df.columns:
+                growth[:, 1:] += \
+                    gdp_growth * df.gdp_growth_adjustment.values[:, None]
+            UC = pd.DataFrame(df.value.values[:, None] * growth,
+                index=df.index, columns=self.yrs)
 
             if b in ["noise"]:
-                self.UC[b] = self.UC[b].sort_index().round(5)
+                self.UC[b] = UC.sort_index().round(5)
             else:
-                self.UC[b] = self.UC[b].sort_index().round(2)
+                self.UC[b] = UC.sort_index().round(2)
 
         # greenhouse unit cost computed separately due to its structure
         b = "c_ghg"
@@ -528,49 +510,76 @@ class RoadCBA(ParamContainer):
         """Compose a time matrix of zeros and ones indicating 
         if maintanance has to be performed in a given year."""
         lvl_order = ["category", "operation_type", "item"]
-        # variant 0
-        mask0 = pd.DataFrame(0, \
-            index=self.df_clean["c_op"].index, columns=self.yrs)
+        periodicity = self.df_clean["c_op"].periodicity.astype(int).values
 
-        for itm in mask0.index:
-            p = self.df_clean["c_op"].loc[itm, "periodicity"].astype(int)
-            if p == 1:
-                mask0.loc[itm] = 1
-            else:
-                v = np.zeros(mask0.shape[1]).astype(int)
-                for i, _ in enumerate(v):
-                    if (i+1) % p == 0:
-                        v[i] = 1
-                mask0.loc[itm] = v
-        
+        def periodic_mask(n_skip):
+            """Ones in every p-th year after the first `n_skip` years,
+            p being the periodicity of each item"""
+            v = np.arange(1, self.N_yr + 1) - n_skip
+            mask = (v > 0) & (v % periodicity[:, None] == 0)
+            return pd.DataFrame(mask.astype(int),
+                index=self.df_clean["c_op"].index, columns=self.yrs)
+
+        # variant 0
+        mask0 = periodic_mask(0)
         self.mask0 = mask0.reorder_levels(lvl_order).sort_index()
         
-        # variant 1
-        mask1 = pd.DataFrame(0, index=self.df_clean["c_op"].index, columns=self.yrs_op)
-        
-        for itm in mask1.index:
-            p = self.df_clean["c_op"].loc[itm, "periodicity"].astype(int)
-            if p == 1:
-                mask1.loc[itm] = 1
-            else:
-                v = np.zeros(mask1.shape[1]).astype(int)
-                for i, _ in enumerate(v):
-                    if (i+1) % p == 0:
-                        v[i] = 1
-                mask1.loc[itm] = v
-        
-        mask1 = pd.DataFrame(mask1, columns=self.yrs).fillna(0).astype(int)
+        # variant 1, maintenance starts after construction
+        mask1 = periodic_mask(self.N_yr_build)
         self.mask1 = mask1.reorder_levels(lvl_order).sort_index()
 
 
+    def _time_matrix(self, s, view=False):
+        """Repeat the values of a series in all years. With view,
+        the frame wraps a read-only broadcast view without copying
+        the values, use it only for internal temporaries."""
+        if view:
+            vals = np.broadcast_to(s.values[:, None], (len(s), self.N_yr))
+        else:
+            vals = np.repeat(s.values[:, None], self.N_yr, axis=1)
+        return pd.DataFrame(vals, index=s.index, columns=self.yrs)
+
+
+    def _join_index(self, ind, other):
+        """Outer join of two indexes, the same as pandas produces
+        when aligning frames with these indexes."""
+        return ind.join(other, how="outer", return_indexers=True)[0]
+
+
+    def _aligned_product(self, ind, *factors, scale=1.0):
+        """Multiply the frames broadcast to the index `ind` in a single
+        pass. Each factor is reindexed by its own levels of `ind`,
+        missing entries become nans as in a pandas product."""
+        cols = factors[0].columns
+        for f in factors[1:]:
+            cols = self._join_index(cols, f.columns)
+
+        res = None
+        for f in factors:
+            names = f.index.names
+            if len(names) == 1:
+                keys = ind.get_level_values(names[0])
+            else:
+                keys = pd.MultiIndex.from_arrays(
+                    [ind.get_level_values(n) for n in names])
+            vals = np.asarray(
+                f.reindex(index=keys, columns=cols).values, dtype=float)
+            if res is None:
+                # scale the first factor directly into the result
+                res = np.multiply(vals, scale)
+            else:
+                res *= vals
+        return pd.DataFrame(res, index=ind, columns=cols)
+
+
     def _create_length_matrix(self):
         """Create the matrix of lengs with years as columns"""
         if self.verbose:
             print("Creating length matrix...")
-        self.L = pd.DataFrame(
-            np.outer(self.RP.length, np.ones_like(self.yrs)),
-            columns=self.yrs, index=self.RP.index
-        )
+        self.L = self._time_matrix(self.RP.length)
+        self.sec_env = pd.MultiIndex.from_arrays(
+            [self.RP.index, self.RP.environment.values],
+            names=["id_section", "environment"])
 
 
     def _compute_travel_time_matrix(self):
@@ -587,18 +596,17 @@ class RoadCBA(ParamContainer):
         if self.verbose:
             print("Creating matrix of fuel ratios by vehicle...")
         rfuel = self.df_clean["r_fuel"].ratio.sort_index()
-        self.RF = pd.DataFrame(repmat(rfuel, self.N_yr, 1).T, \
-            columns=self.yrs, index=rfuel.index)
+        self.RF = self._time_matrix(rfuel)
 
 
     # =====
     # Functions to compute economic benefits and costs
     # =====
-    def economic_analysis(self, param_source=None):
+    def economic_analysis(self, param_source=None, use_cache=False):
         """Wrapping method for the overall computation
         of costs, benefits and overall indicators (ENPV, ERR, BCR)."""
         ti = time.time()
-        self.prepare_parameters(source=param_source)
+        self.prepare_parameters(source=param_source, use_cache=use_cache)
         self.compute_costs_benefits()
         self.compute_economic_indicators()
 
@@ -644,27 +652,33 @@ class RoadCBA(ParamContainer):
 
 
     def compute_economic_indicators(self):
-        """Perform economic analysis"""
+        """Perform economic analysis. Cash flows are discounted
+        to the first year of the table of costs and benefits, which
+        is the first year of intensities if they start earlier."""
+        import numpy_financial as npf
         assert self.NB is not None, "Compute economic benefits first."
 
         if self.verbose:
             print("\nComputing ENPV, ERR, BCR...")
-        self.df_eco = pd.DataFrame(self.NB).T
         self.df_eco = pd.concat(
             [-pd.DataFrame(self.NC).T, pd.DataFrame(self.NB).T],
             keys=["cost", "benefit"], names=["type", "item"]
         ).round(2)
 
-        self.df_eco = self.df_eco.fillna(0.0) # remove nans
+        # years in order, pandas>=1.4 does not sort the columns in concat
+        self.df_eco = self.df_eco.fillna(0.0).sort_index(axis=1) # remove nans
 
+        # discounting of all items at once to the first year of the
+        # table, exponents follow the year labels, not column positions
+        yrs = self.df_eco.columns.values.astype(int)
+        disc = (1.0 + self.r_eco) ** (yrs - yrs.min())
         self.df_enpv = pd.DataFrame(
-            self.df_eco.apply(
-                lambda x: npf.npv(self.r_eco, x), axis=1
-            ).round(2), columns=["value"]
+            (self.df_eco.values / disc).sum(1).round(2),
+            index=self.df_eco.index, columns=["value"]
         )
 
         # compute economic indicators
-        self.ENPV = npf.npv(self.r_eco, self.df_eco.sum())
+        self.ENPV = (self.df_eco.sum().values / disc).sum()
         self.ERR = npf.irr(self.df_eco.sum())
         self.EBCR = (self.df_enpv.loc["benefit"].sum() / -self.df_enpv.loc["cost"].sum()).value
         
@@ -687,8 +701,9 @@ class RoadCBA(ParamContainer):
         assert self.T1 is not None, "Compute travel time first."
 
         b = "vtts"
-        self.B0[b] = self.UC[b] * self.T0 * self.I0 * DAYS_YEAR
-        self.B1[b] = self.UC[b] * self.T1 * self.I1 * DAYS_YEAR
+        UC = self.UC[b] * DAYS_YEAR
+        self.B0[b] = UC * self.T0 * self.I0
+        self.B1[b] = UC * self.T1 * self.I1
         self.NB[b] = self.B0[b].sum() - self.B1[b].sum()
 
 
@@ -699,11 +714,13 @@ class RoadCBA(ParamContainer):
         assert self.L is not None, "Compute length matrix first."
 
         b = "voc"
-        dum = pd.DataFrame(1, index=pd.MultiIndex.from_product(\
-            [self.L.index, self.UC[b].index]), columns=self.yrs)
-        dum.index.names = ["id_section", "vehicle"]
-        self.B0[b] = ((self.UC[b] * dum) * self.L) * self.I0 * DAYS_YEAR
-        self.B1[b] = ((self.UC[b] * dum) * self.L) * self.I1 * DAYS_YEAR
+        # broadcast unit costs and lengths to all sections and vehicles
+        ind = pd.MultiIndex.from_product([self.L.index, self.UC[b].index],
+            names=["id_section", "vehicle"])
+        for I, B in [(self.I0, self.B0), (self.I1, self.B1)]:
+            B[b] = self._aligned_product(
+                self._join_index(ind, I.index),
+                self.UC[b], self.L, I, scale=DAYS_YEAR)
         self.NB[b] = self.B0[b].sum() - self.B1[b].sum()
 
 
@@ -715,20 +732,22 @@ class RoadCBA(ParamContainer):
 
         b = "accidents"
         scale = 1e-8
-        LL = self.L.merge(\
-            self.RP[["lanes", "environment", "category", "layout"]], \
-            how="left", on="id_section").reset_index()\
-            .set_index(["id_section", "lanes", "environment", "category", \
-            "layout"]).reorder_levels(\
-                ["id_section", "category", "lanes", "layout", "environment"])
-        LL.columns = LL.columns.astype(int)
-
-        UCA = (LL * self.UC["c_acc"] * scale)\
-            .droplevel(["layout", "lanes", "category", "environment"])\
-            .dropna(subset=[self.yr_init]).sort_index()
-
-        self.B0[b] = UCA * self.I0 * DAYS_YEAR
-        self.B1[b] = UCA * self.I1 * DAYS_YEAR
+
+        # unit costs by section type, sections without them
+        # or with a blank unit cost in the first year are skipped
+        keys = pd.MultiIndex.from_frame(
+            self.RP[["category", "lanes", "layout", "environment"]])
+        pos = self.UC["c_acc"].index.get_indexer(keys)
+        UCA = self.UC["c_acc"].reindex(columns=self.yrs).values
+        has = pos >= 0
+        has[has] = ~np.isnan(UCA[pos[has], 0])
+        UCA = UCA[pos[has]]
+
+        UCA = pd.DataFrame(self.L.values[has] * UCA * scale * DAYS_YEAR,
+            index=self.L.index[has], columns=self.yrs).sort_index()
+
+        self.B0[b] = UCA * self.I0
+        self.B1[b] = UCA * self.I1
         self.NB[b] = self.B0[b].sum() - self.B1[b].sum()
 
 
@@ -739,36 +758,43 @@ class RoadCBA(ParamContainer):
         assert self.L is not None, "Compute length matrix first."
 
         # polynomial coefficients and consumption function
-        def vel2cons(coeffs, v):
+        def vel2cons(C, V):
             """Convert velocity in km/h to fuel consumption in
-            kg/km via a polynomial"""
-            return np.polyval(coeffs[::-1], v)
+            kg/km via a polynomial. Horner's scheme is applied to
+            all rows at once, row i of velocities `V` uses row i
+            of coefficients `C`."""
+            cons = 0.0
+            for a in C.T[::-1]:
+                cons = cons * V + a[:, None]
+            return cons
 
         # length matrix with appropriate division of fuel/vehicle types
-        dum = pd.DataFrame(1, index=pd.MultiIndex.from_product(\
-            [self.secs, self.veh_types]), columns=self.yrs)
-        dum.index.names = ["id_section", "vehicle"]
-        L = self.L * dum
-        
-        ind = self.df_clean["r_fuel"].reset_index()[["vehicle", "fuel"]]
-        L = L.reset_index().merge(ind, how="left", on="vehicle")\
-            .set_index(["id_section", "vehicle", "fuel"])
-        L = L.sort_index()
-
-        # quantity of fuel, variant 0
-        self.QF0 = pd.DataFrame(columns=self.yrs, index=L.loc[self.secs_0].index)
-        for ind, _ in self.QF0.iterrows():
-            ids, veh, f = ind
-            self.QF0.loc[(ids, veh, f)] = self.V0.loc[(ids, veh)]\
-                .map(lambda v: vel2cons(self.df_clean["fuel_coeffs"].loc[(veh, f)], v)) * L.loc[ind]
-
-        # quantity of fuel, variant 1
-        self.QF1 = pd.DataFrame(columns=self.yrs, index=L.loc[self.secs_1].index)
-        for ind, _ in self.QF1.iterrows():
-            ids, veh, f = ind
-            self.QF1.loc[(ids, veh, f)] = self.V1.loc[(ids, veh)]\
-                .map(lambda v: vel2cons(\
-                self.df_clean["fuel_coeffs"].loc[(veh, f)], v)) * L.loc[ind]
+        vf = self.df_clean["r_fuel"].index
+        vf = vf[vf.get_level_values("vehicle").isin(self.veh_types)]
+        n = len(self.secs)
+        ind = pd.MultiIndex.from_arrays([
+            np.repeat(self.secs.values, len(vf)),
+            np.tile(vf.get_level_values("vehicle"), n),
+            np.tile(vf.get_level_values("fuel"), n)],
+            names=["id_section", "vehicle", "fuel"]).sortlevel()[0]
+        L = self.L.reindex(ind.get_level_values("id_section"))
+        L.index = ind
+
+        coeffs = self.df_clean["fuel_coeffs"]
+
+        def fuel_quantity(secs, V):
+            """Quantity of fuel by section, vehicle and fuel type"""
+            Lv = L.loc[secs]
+            ind = Lv.index
+            C = coeffs.reindex(pd.MultiIndex.from_arrays(
+                [ind.get_level_values("vehicle"), ind.get_level_values("fuel")]))
+            V = V.reindex(index=ind.droplevel("fuel"), columns=self.yrs)
+            return pd.DataFrame(vel2cons(C.values, V.values) * Lv.values,
+                index=ind, columns=self.yrs)
+
+        # quantity of fuel, variant 0 and 1
+        self.QF0 = fuel_quantity(self.secs_0, self.V0)
+        self.QF1 = fuel_quantity(self.secs_1, self.V1)
 
 
     def _compute_fuel_cost(self):
@@ -780,8 +806,12 @@ class RoadCBA(ParamContainer):
 
         b = "fuel"
         c = "c_fuel"
-        self.B0[b] = (self.UC[c] * self.RF) * (self.QF0 * self.I0) * DAYS_YEAR
-        self.B1[b] = (self.UC[c] * self.RF) * (self.QF1 * self.I1) * DAYS_YEAR
+        ind_ucr = self._join_index(self.UC[c].index, self.RF.index)
+        for QF, I, B in [(self.QF0, self.I0, self.B0), (self.QF1, self.I1, self.B1)]:
+            ind = self._join_index(ind_ucr,
+                self._join_index(QF.index, I.index))
+            B[b] = self._aligned_product(ind, self.UC[c], self.RF, QF, I,
+                scale=DAYS_YEAR)
         self.NB[b] = self.B0[b].sum() - self.B1[b].sum()
 
 
@@ -798,8 +828,12 @@ class RoadCBA(ParamContainer):
             np.outer(self.df_clean["r_ghg"].values, self.UC["c_ghg"].values),\
             index=self.df_clean["r_ghg"].index, columns=self.yrs)
         
-        self.B0[b] = (UCG * self.RF) * (self.QF0 * self.I0) * DAYS_YEAR
-        self.B1[b] = (UCG * self.RF) * (self.QF1 * self.I1) * DAYS_YEAR
+        ind_ucr = self._join_index(UCG.index, self.RF.index)
+        for QF, I, B in [(self.QF0, self.I0, self.B0), (self.QF1, self.I1, self.B1)]:
+            ind = self._join_index(ind_ucr,
+                self._join_index(QF.index, I.index))
+            B[b] = self._aligned_product(ind, UCG, self.RF, QF, I,
+                scale=DAYS_YEAR)
         self.NB[b] = self.B0[b].sum() - self.B1[b].sum()
 
 
@@ -811,23 +845,41 @@ class RoadCBA(ParamContainer):
         assert self.QF1 is not None, "Compute matrix of fuel consumption (QF1) first."
         
         b = "emissions"
-        RE = pd.DataFrame(repmat(self.df_clean["r_em"].value, self.N_yr, 1).T, 
-                  columns=self.yrs, index=self.df_clean["r_em"].index)
+        # ratios of polluants by vehicle and fuel
+        RE = self.df_clean["r_em"].value.unstack("polluant").fillna(0.0)
+        pols = RE.columns
 
-        # UCE: unit cost of emissions in EUR/kg(fuel)
-        UCE = RE * self.UC["c_em"]
-        UCE = UCE.groupby(["fuel", "vehicle", "environment"]).sum()
-        UCE = UCE.reset_index()\
-            .set_index(["environment", "vehicle", "fuel"]).sort_index()
+        # unit costs by polluant, environment and year
+        envs = self.UC["c_em"].index.get_level_values("environment")\
+            .unique().sort_values()
+        CE = self.UC["c_em"].reindex(
+            index=pd.MultiIndex.from_product([pols, envs]), columns=self.yrs)\
+            .fillna(0.0).values.reshape(len(pols), len(envs), self.N_yr)
+
+        # UCE: unit cost of emissions in EUR/kg(fuel), summed over polluants
+        UCE = np.einsum("ap,pey->eay", RE.values, CE)
 
         # add section ID
-        UCE = UCE.reset_index().merge(self.RP.environment.reset_index(), \
-            how="left", on="environment").set_index(\
-            ["id_section", "environment", "vehicle", "fuel"]).sort_index()
+        sec_env = self.sec_env
+        env = envs.get_indexer(sec_env.get_level_values("environment"))
+        sec_env, env = sec_env[env >= 0], env[env >= 0]
+        n = len(RE)
+        ind, order = pd.MultiIndex.from_arrays([
+            np.repeat(sec_env.get_level_values("id_section"), n),
+            np.repeat(sec_env.get_level_values("environment"), n),
+            np.tile(RE.index.get_level_values("vehicle"), len(env)),
+            np.tile(RE.index.get_level_values("fuel"), len(env))],
+            names=["id_section", "environment", "vehicle", "fuel"]).sortlevel()
+        UCE = pd.DataFrame(UCE[env].reshape(-1, self.N_yr)[order],
+            index=ind, columns=self.yrs)
         
         lvl_order = ["id_section", "vehicle", "fuel", "environment"]
-        self.B0[b] = (UCE * self.RF).reorder_levels(lvl_order).sort_index() * (self.QF0 * self.I0) * DAYS_YEAR
-        self.B1[b] = (UCE * self.RF).reorder_levels(lvl_order).sort_index() * (self.QF1 * self.I1) * DAYS_YEAR
+        ind = self._join_index(UCE.index, self.RF.index)\
+            .reorder_levels(lvl_order).sortlevel()[0]
+        for QF, I, B in [(self.QF0, self.I0, self.B0), (self.QF1, self.I1, self.B1)]:
+            B[b] = self._aligned_product(
+                self._join_index(ind, self._join_index(QF.index, I.index)),
+                UCE, self.RF, QF, I, scale=DAYS_YEAR)
         self.NB[b] = self.B0[b].sum() - self.B1[b].sum()
 
 
@@ -837,14 +889,14 @@ class RoadCBA(ParamContainer):
         assert self.L is not None, "Compute length matrix first."
 
         b = "noise"
-        L = self.L.reset_index().merge(self.RP.environment.reset_index())
-        L = L.set_index(["id_section", "environment"])
+        L = pd.DataFrame(self.L.values, index=self.sec_env, columns=self.yrs)
         
         # CN: cost of noise in EUR
         CN = (self.UC[b] * L).reorder_levels(["id_section", "environment", "vehicle"]).sort_index()
 
-        self.B0[b] = CN * self.I0 * DAYS_YEAR
-        self.B1[b] = CN * self.I1 * DAYS_YEAR
+        CN *= DAYS_YEAR
+        self.B0[b] = CN * self.I0
+        self.B1[b] = CN * self.I1
         self.NB[b] = self.B0[b].sum() - self.B1[b].sum()
 
 
@@ -881,6 +933,15 @@ class RoadCBA(ParamContainer):
         raise NotImplementedError()
     
 
+def sort_year_columns(dff):
+    """Convert the year columns to integers and sort them.
+    The frame is copied only if the years are not in order."""
+    dff.columns = dff.columns.astype(int)
+    if not dff.columns.is_monotonic_increasing:
+        dff = dff[sorted(dff.columns)]
+    return dff
+
+
 def check_year_order(dff, year_start, year_end, n_year):
     pass
 